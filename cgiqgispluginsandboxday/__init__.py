@@ -1,16 +1,27 @@
-"""Initialize the plugin package."""
+"""Initialize the plugin package.
 
-from qgis.gui import QgisInterface
+The plugin modules are imported in ``classFactory`` so that the worker
+processes of ``workers.RoutePostProcessor`` can import ``kernels`` without
+importing qgis.
+"""
 
-from cgiqgispluginsandboxday.debugger import setup_debugger
-from cgiqgispluginsandboxday.logger import get_logger
-from cgiqgispluginsandboxday.plugin import Plugin
+from __future__ import annotations
 
-logger = get_logger()
+from typing import TYPE_CHECKING
 
-setup_debugger()
+if TYPE_CHECKING:
+    from qgis.gui import QgisInterface
 
+    from cgiqgispluginsandboxday.plugin import Plugin
 
-def classFactory(iface: "QgisInterface") -> Plugin:  # noqa: N802
+
+def classFactory(iface: QgisInterface) -> Plugin:  # noqa: N802
     """Plugin class factory."""
+    from cgiqgispluginsandboxday.debugger import setup_debugger  # noqa: PLC0415
+    from cgiqgispluginsandboxday.logger import get_logger  # noqa: PLC0415
+    from cgiqgispluginsandboxday.plugin import Plugin  # noqa: PLC0415
+
+    get_logger()
+    setup_debugger()
+
     return Plugin()
@@ -0,0 +1,93 @@
+"""In-memory caches for results fetched from the Navici APIs."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator
+from typing import Any
+
+from cgiqgispluginsandboxday.session import get_state
+
+# Route results keyed by estimator.route_cache_key, see estimator.cache_route_result
+ROUTE_CACHE = "route"
+GEOCODE_CACHE = "geocode"
+
+DEFAULT_MAX_SIZE = 10000
+
+
+class ResultCache:
+    """Thread safe least recently used cache."""
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        entries: OrderedDict[Hashable, Any] | None = None,
+    ) -> None:
+        """Initialize the cache.
+
+        :param max_size: Maximum number of entries. The least recently used
+            entries are dropped when the cache grows beyond this.
+        :param entries: Existing entries to use as the cache storage.
+        """
+        self.max_size = max_size
+        self.entries: OrderedDict[Hashable, Any] = (
+            OrderedDict() if entries is None else entries
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached entries."""
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check whether the key is cached without touching its recency."""
+        return key in self.entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:  # noqa: ANN401
+        """Get a cached value and mark it as recently used."""
+        with self._lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:  # noqa: ANN401
+        """Cache a value."""
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def values(self) -> Iterator[Any]:
+        """Iterate over a snapshot of the cached values."""
+        with self._lock:
+            values = list(self.entries.values())
+        return iter(values)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self.entries.clear()
+
+
+_caches: dict[str, ResultCache] = {}
+
+
+def get_cache(name: str) -> ResultCache:
+    """Get the named cache, creating it on first use.
+
+    The cache entries are kept as plain data in the persistent session state,
+    so they stay warm across plugin reloads and QGIS restarts. Only the
+    wrapping ResultCache is recreated after a reload, which keeps the snapshot
+    free of plugin classes that a reload replaces.
+    """
+    storages: dict[str, OrderedDict] = get_state("caches", dict, persistent=True)
+    entries = storages.setdefault(name, OrderedDict())
+
+    cache = _caches.get(name)
+    if cache is None or cache.entries is not entries:
+        cache = _caches[name] = ResultCache(entries=entries)
+
+    return cache
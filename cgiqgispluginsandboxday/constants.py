@@ -1,3 +1,9 @@
 """Constants for the CGI QGIS plugin sandbox day."""
 
 PLUGIN_NAME = "CGI QGIS Plugin Sandbox Day"
+
+NAVICI_API_KEY_ENV = "NAVICI_API_KEY"
+GEOCODING_URL = "https://mapservices.navici.com/geocoding"
+NAVICI_CRS = "EPSG:3067"
+
+SETTINGS_PREFIX = "cgiqgispluginsandboxday"
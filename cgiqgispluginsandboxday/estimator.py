@@ -0,0 +1,315 @@
+"""Local travel cost estimates learned from cached route results.
+
+The estimator predicts travel time and route length from the straight-line
+distance between two points with a piecewise linear regression fitted per
+region. Regions are cells of a regular grid in the projected coordinate
+system of the samples (EPSG:3067 by default in the Navici APIs). Regions with
+too few samples fall back to a model fitted over all samples.
+
+Estimates are meant for ranking candidates before calling the routing API, for
+example to route only the k nearest depots by estimated travel time.
+
+The plugin has no routing client yet. The estimator learns from the route
+results that routing code stores with ``cache_route_result``.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from cgiqgispluginsandboxday.cache import ROUTE_CACHE, ResultCache, get_cache
+from cgiqgispluginsandboxday.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_CELL_SIZE = 50000.0
+DEFAULT_KNOT_COUNT = 4
+DEFAULT_MIN_REGION_SAMPLES = 30
+
+
+@dataclass(frozen=True)
+class RouteSample:
+    """Travel time and length of a computed route between two points."""
+
+    start: tuple[float, float]
+    end: tuple[float, float]
+    travel_time: float
+    length: float
+
+
+@dataclass(frozen=True)
+class EstimationError:
+    """Error of the estimates against known route results.
+
+    The relative errors are computed over the samples with a positive target
+    and are NaN if there are none.
+    """
+
+    sample_count: int
+    time_mae: float
+    time_mape: float
+    length_mae: float
+    length_mape: float
+
+
+class TravelCostEstimator:
+    """Piecewise linear travel cost model per grid region."""
+
+    def __init__(
+        self,
+        cell_size: float = DEFAULT_CELL_SIZE,
+        knot_count: int = DEFAULT_KNOT_COUNT,
+        min_region_samples: int = DEFAULT_MIN_REGION_SAMPLES,
+    ) -> None:
+        """Initialize the estimator.
+
+        :param cell_size: Size of the region grid cells in map units.
+        :param knot_count: Number of breakpoints in the piecewise regression.
+            The breakpoints are placed at quantiles of the training distances.
+        :param min_region_samples: Minimum number of samples for fitting a
+            separate model for a region.
+        """
+        self.cell_size = cell_size
+        self.knot_count = knot_count
+        self.min_region_samples = min_region_samples
+        self.knots = np.empty(0)
+        self._global_coefficients: np.ndarray | None = None
+        self._region_coefficients: dict[tuple[int, int], np.ndarray] = {}
+
+    @property
+    def is_fitted(self) -> bool:
+        """Whether the estimator has been fitted."""
+        return self._global_coefficients is not None
+
+    def _regions(self, starts: np.ndarray) -> np.ndarray:
+        return np.floor(starts / self.cell_size).astype(np.int64)
+
+    def _design_matrix(self, distances: np.ndarray) -> np.ndarray:
+        hinges = np.maximum(distances[:, None] - self.knots[None, :], 0.0)
+        return np.column_stack((np.ones_like(distances), distances, hinges))
+
+    def fit(self, samples: Sequence[RouteSample]) -> TravelCostEstimator:
+        """Fit the model.
+
+        :param samples: Route results to learn from.
+
+        :returns: The fitted estimator.
+        """
+        if not samples:
+            raise ValueError("At least one route sample is required")
+
+        starts, ends, targets = _as_arrays(samples)
+        distances = np.hypot(*(ends - starts).T)
+
+        quantiles = np.linspace(0, 1, self.knot_count + 2)[1:-1]
+        self.knots = np.unique(np.quantile(distances, quantiles))
+
+        design = self._design_matrix(distances)
+        self._global_coefficients = np.linalg.lstsq(design, targets, rcond=None)[0]
+
+        self._region_coefficients = {}
+        regions = self._regions(starts)
+        unique_regions, inverse, counts = np.unique(
+            regions, axis=0, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        for index in np.flatnonzero(counts >= self.min_region_samples):
+            mask = inverse == index
+            region = (int(unique_regions[index, 0]), int(unique_regions[index, 1]))
+            self._region_coefficients[region] = np.linalg.lstsq(
+                design[mask], targets[mask], rcond=None
+            )[0]
+
+        logger.info(
+            "Fitted travel cost estimator from %d samples with %d regional models",
+            len(samples),
+            len(self._region_coefficients),
+        )
+        return self
+
+    def predict(
+        self, starts: np.ndarray, ends: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Estimate travel times and lengths.
+
+        :param starts: Start points, shape (n, 2).
+        :param ends: End points, shape (n, 2).
+
+        :returns: Estimated travel times and lengths.
+        """
+        if self._global_coefficients is None:
+            raise RuntimeError("The estimator has not been fitted")
+
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        distances = np.hypot(*(ends - starts).T)
+        design = self._design_matrix(distances)
+
+        estimates = design @ self._global_coefficients
+        regions = self._regions(starts)
+        for region, coefficients in self._region_coefficients.items():
+            mask = np.all(regions == region, axis=1)
+            if mask.any():
+                estimates[mask] = design[mask] @ coefficients
+
+        # A route is never shorter than the straight line
+        travel_times = np.maximum(estimates[:, 0], 0.0)
+        lengths = np.maximum(estimates[:, 1], distances)
+        return travel_times, lengths
+
+    def rank(
+        self,
+        origin: tuple[float, float],
+        candidates: np.ndarray,
+        k: int,
+        mode: str = "time",
+    ) -> np.ndarray:
+        """Get the candidates with the lowest estimated travel cost.
+
+        :param origin: The point routes start from.
+        :param candidates: Candidate destinations, shape (n, 2).
+        :param k: Number of candidates to return.
+        :param mode: Metric to rank by, either "time" or "len" as in the routing
+            API.
+
+        :returns: Indices of the k best candidates, best first.
+        """
+        if mode not in ("time", "len"):
+            raise ValueError(f"Unknown mode {mode}")
+
+        candidates = np.asarray(candidates, dtype=np.float64).reshape(-1, 2)
+        starts = np.broadcast_to(np.asarray(origin, dtype=np.float64), candidates.shape)
+        travel_times, lengths = self.predict(starts, candidates)
+        costs = travel_times if mode == "time" else lengths
+
+        k = min(k, len(costs))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        best = np.argpartition(costs, k - 1)[:k]
+        return best[np.argsort(costs[best])]
+
+    def evaluate(self, samples: Sequence[RouteSample]) -> EstimationError:
+        """Measure the estimation error against known route results."""
+        if not samples:
+            raise ValueError("At least one route sample is required")
+
+        starts, ends, targets = _as_arrays(samples)
+        travel_times, lengths = self.predict(starts, ends)
+        errors = np.abs(np.column_stack((travel_times, lengths)) - targets)
+
+        return EstimationError(
+            sample_count=len(samples),
+            time_mae=float(errors[:, 0].mean()),
+            time_mape=_mean_relative_error(errors[:, 0], targets[:, 0]),
+            length_mae=float(errors[:, 1].mean()),
+            length_mape=_mean_relative_error(errors[:, 1], targets[:, 1]),
+        )
+
+
+def _mean_relative_error(errors: np.ndarray, targets: np.ndarray) -> float:
+    """Get the mean relative error over the samples with a positive target."""
+    positive = targets > 0
+    if not positive.any():
+        return float("nan")
+    return float((errors[positive] / targets[positive]).mean())
+
+
+def _as_arrays(
+    samples: Iterable[RouteSample],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    samples = list(samples)
+    starts = np.array([sample.start for sample in samples], dtype=np.float64)
+    ends = np.array([sample.end for sample in samples], dtype=np.float64)
+    targets = np.array(
+        [(sample.travel_time, sample.length) for sample in samples], dtype=np.float64
+    )
+    return starts.reshape(-1, 2), ends.reshape(-1, 2), targets.reshape(-1, 2)
+
+
+def route_cache_key(
+    start: tuple[float, float],
+    end: tuple[float, float],
+    method: str = "car",
+    mode: str = "time",
+) -> tuple:
+    """Get the route cache key of a route between two points."""
+    return ("route", tuple(start), tuple(end), method, mode)
+
+
+def cache_route_result(
+    sample: RouteSample,
+    method: str = "car",
+    mode: str = "time",
+    cache: ResultCache | None = None,
+) -> None:
+    """Store a computed route in the route cache for fitting the estimator.
+
+    Routing code should call this for every route result. The route cache
+    maps ``route_cache_key`` keys to ``(start, end, travel_time, length)``
+    tuples, kept as plain data so the cache can be snapshotted to disk and
+    survives plugin reloads.
+    """
+    if cache is None:
+        cache = get_cache(ROUTE_CACHE)
+
+    cache.put(
+        route_cache_key(sample.start, sample.end, method, mode),
+        (tuple(sample.start), tuple(sample.end), sample.travel_time, sample.length),
+    )
+
+
+def cached_samples(cache: ResultCache | None = None) -> list[RouteSample]:
+    """Get the route samples stored in the route cache."""
+    if cache is None:
+        cache = get_cache(ROUTE_CACHE)
+
+    return [
+        RouteSample(*value)
+        for value in cache.values()
+        if isinstance(value, tuple) and len(value) == 4  # noqa: PLR2004
+    ]
+
+
+def fit_with_holdout(
+    samples: Sequence[RouteSample] | None = None,
+    holdout_fraction: float = 0.2,
+    seed: int = 0,
+    **kwargs: Any,  # noqa: ANN401
+) -> tuple[TravelCostEstimator, EstimationError]:
+    """Fit an estimator and measure its error on held-out samples.
+
+    :param samples: Route results to use. Defaults to the cached route results.
+    :param holdout_fraction: Share of the samples held out from fitting.
+    :param seed: Seed for picking the held-out samples.
+    :param kwargs: Arguments passed to ``TravelCostEstimator``.
+
+    :returns: The fitted estimator and its error on the held-out samples.
+    """
+    if samples is None:
+        samples = cached_samples()
+    if len(samples) < 2:  # noqa: PLR2004
+        raise ValueError(
+            "At least two route samples are required, route results are added "
+            "to the cache with cache_route_result"
+        )
+
+    order = np.random.default_rng(seed).permutation(len(samples))
+    holdout_count = min(
+        max(1, round(len(samples) * holdout_fraction)), len(samples) - 1
+    )
+
+    estimator = TravelCostEstimator(**kwargs).fit(
+        [samples[index] for index in order[holdout_count:]]
+    )
+    error = estimator.evaluate([samples[index] for index in order[:holdout_count]])
+    logger.info(
+        "Travel cost estimate error on %d held-out routes: time %.1f %%, length %.1f %%",
+        error.sample_count,
+        error.time_mape * 100,
+        error.length_mape * 100,
+    )
+    return estimator, error
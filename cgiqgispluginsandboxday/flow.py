@@ -0,0 +1,133 @@
+"""Aggregate many route lines into a shared segment flow network."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+import numpy as np
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsField,
+    QgsGeometry,
+    QgsPointXY,
+    QgsUnitTypes,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from cgiqgispluginsandboxday.kernels import aggregate_segments, route_segments
+from cgiqgispluginsandboxday.logger import get_logger
+
+if TYPE_CHECKING:
+    from cgiqgispluginsandboxday.workers import RoutePostProcessor
+
+logger = get_logger()
+
+DEFAULT_TOLERANCE_METERS = 1.0
+
+# Smaller route sets are aggregated faster in process than in worker processes
+PARALLEL_MIN_VERTICES = 200000
+
+
+def _geometry_parts(geometry: QgsGeometry) -> Iterable[np.ndarray]:
+    """Yield the vertices of every line part in the geometry."""
+    if geometry.isMultipart():
+        parts = geometry.asMultiPolyline()
+    else:
+        parts = [geometry.asPolyline()]
+    for part in parts:
+        yield np.array([(point.x(), point.y()) for point in part], dtype=np.float64)
+
+
+def tolerance_for_crs(
+    crs: QgsCoordinateReferenceSystem, meters: float = DEFAULT_TOLERANCE_METERS
+) -> float:
+    """Convert a snapping tolerance in meters to the map units of the CRS.
+
+    For geographic coordinate systems the conversion is approximate, using the
+    length of a degree at the equator.
+    """
+    return meters * QgsUnitTypes.fromUnitToUnitFactor(
+        QgsUnitTypes.DistanceMeters, crs.mapUnits()
+    )
+
+
+def create_flow_layer(
+    route_layer: QgsVectorLayer,
+    travel_time_field: str | None = None,
+    tolerance: float | None = None,
+    name: str = "Route flow",
+    post_processor: RoutePostProcessor | None = None,
+) -> QgsVectorLayer:
+    """Create a memory layer with the aggregated flow of the route layer.
+
+    :param route_layer: Layer with route line geometries.
+    :param travel_time_field: Optional field holding the travel time of each
+        route.
+    :param tolerance: Snapping tolerance in layer units. Defaults to
+        ``DEFAULT_TOLERANCE_METERS`` converted to the units of the layer CRS.
+    :param name: Name of the created layer.
+    :param post_processor: Process pool for aggregating large route sets. The
+        features are read and the layer is written in the QGIS process.
+
+    :returns: Line layer with one feature per unique segment and the fields
+        ``count`` and ``travel_time``.
+    """
+    if tolerance is None:
+        tolerance = tolerance_for_crs(route_layer.crs())
+
+    routes: list[np.ndarray] = []
+    travel_times: list[float] = []
+    for feature in route_layer.getFeatures():
+        geometry = feature.geometry()
+        if geometry.isNull() or geometry.type() != QgsWkbTypes.LineGeometry:
+            continue
+        parts = list(_geometry_parts(geometry))
+        part_lengths = [
+            float(np.hypot(*np.diff(part, axis=0).T).sum()) for part in parts
+        ]
+        total_length = sum(part_lengths)
+        travel_time = (
+            float(feature[travel_time_field] or 0) if travel_time_field else 0.0
+        )
+        for part, length in zip(parts, part_lengths):
+            routes.append(part)
+            travel_times.append(
+                travel_time * length / total_length if total_length else 0.0
+            )
+
+    vertex_count = sum(len(route) for route in routes)
+    if post_processor is not None and vertex_count >= PARALLEL_MIN_VERTICES:
+        network = post_processor.aggregate(routes, travel_times, tolerance)
+    else:
+        network = aggregate_segments(
+            *route_segments(routes, travel_times), tolerance=tolerance
+        )
+    logger.info("Aggregated %d route parts into %d segments", len(routes), len(network))
+
+    # Custom CRSs have no authority identifier to put in the layer URI
+    layer = QgsVectorLayer("LineString", name, "memory")
+    layer.setCrs(route_layer.crs())
+    provider = layer.dataProvider()
+    provider.addAttributes(
+        [QgsField("count", QVariant.Int), QgsField("travel_time", QVariant.Double)]
+    )
+    layer.updateFields()
+
+    features = []
+    for start, end, count, time in zip(
+        network.start, network.end, network.count, network.travel_time
+    ):
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(
+            QgsGeometry.fromPolylineXY([QgsPointXY(*start), QgsPointXY(*end)])
+        )
+        feature.setAttributes([int(count), float(time)])
+        features.append(feature)
+    provider.addFeatures(features)
+    layer.updateExtents()
+
+    return layer
@@ -0,0 +1,186 @@
+"""Client for the Navici geocoding API."""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any
+
+from qgis.core import (
+    QgsBlockingNetworkRequest,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsFeature,
+    QgsPointXY,
+    QgsProject,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QObject, QUrl, QUrlQuery, pyqtSignal
+from qgis.PyQt.QtNetwork import QNetworkRequest
+
+from cgiqgispluginsandboxday.cache import GEOCODE_CACHE, get_cache
+from cgiqgispluginsandboxday.constants import (
+    GEOCODING_URL,
+    NAVICI_API_KEY_ENV,
+    NAVICI_CRS,
+)
+from cgiqgispluginsandboxday.logger import get_logger
+
+logger = get_logger()
+
+# Coordinates are rounded to this many decimals in the cache keys
+KEY_PRECISION = 1
+
+
+class InteractiveRequests(QObject):
+    """Tracks the interactive requests in flight.
+
+    Background work should wait while interactive requests are running.
+    """
+
+    started = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self) -> None:
+        """Initialize the tracker."""
+        super().__init__()
+        self.count = 0
+
+    @property
+    def active(self) -> bool:
+        """Whether any interactive requests are in flight."""
+        return self.count > 0
+
+    def begin(self) -> None:
+        """Mark an interactive request started."""
+        self.count += 1
+        self.started.emit()
+
+    def end(self) -> None:
+        """Mark an interactive request finished."""
+        self.count -= 1
+        self.finished.emit()
+
+
+interactive_requests = InteractiveRequests()
+
+
+def reverse_geocode_key(x: float, y: float, crs: str = NAVICI_CRS) -> tuple:
+    """Get the cache key of a reverse geocoding lookup."""
+    return ("reverse", round(x, KEY_PRECISION), round(y, KEY_PRECISION), crs)
+
+
+def geocoding_transform(layer: QgsVectorLayer) -> QgsCoordinateTransform:
+    """Get the transform from the layer CRS to the geocoding CRS."""
+    return QgsCoordinateTransform(
+        layer.crs(), QgsCoordinateReferenceSystem(NAVICI_CRS), QgsProject.instance()
+    )
+
+
+def feature_point(
+    feature: QgsFeature, transform: QgsCoordinateTransform
+) -> QgsPointXY | None:
+    """Get the point a feature is reverse geocoded at.
+
+    Prefetching and feature lookups use the same point, a point on the
+    surface of the feature, so that they share cache entries.
+
+    :param feature: The feature.
+    :param transform: Transform from the layer CRS, see ``geocoding_transform``.
+
+    :returns: The point in the geocoding CRS or None if the feature has no
+        geometry or the point cannot be transformed.
+    """
+    if not feature.hasGeometry():
+        return None
+    try:
+        return transform.transform(feature.geometry().pointOnSurface().asPoint())
+    except QgsCsException:
+        return None
+
+
+def reverse_geocode_request(
+    x: float, y: float, crs: str = NAVICI_CRS
+) -> QNetworkRequest:
+    """Create a reverse geocoding request for a point.
+
+    :param x: X coordinate of the point.
+    :param y: Y coordinate of the point.
+    :param crs: Coordinate reference system of the point.
+
+    :returns: The network request.
+    """
+    query = QUrlQuery()
+    query.addQueryItem("x", str(x))
+    query.addQueryItem("y", str(y))
+    query.addQueryItem("from", crs)
+    query.addQueryItem("to", crs)
+    query.addQueryItem("apikey", os.environ.get(NAVICI_API_KEY_ENV, ""))
+
+    url = QUrl(f"{GEOCODING_URL}/reverse")
+    url.setQuery(query)
+    return QNetworkRequest(url)
+
+
+def parse_response(content: bytes) -> dict[str, Any] | None:
+    """Parse a geocoding response, returning None for invalid content."""
+    try:
+        return json.loads(content)
+    except ValueError:
+        logger.warning("Invalid geocoding response")
+        return None
+
+
+def reverse_geocode(x: float, y: float, crs: str = NAVICI_CRS) -> dict[str, Any] | None:
+    """Look up the address of a point.
+
+    Cached results are returned without a request. The request blocks, so it
+    is meant for interactive lookups such as identifying a clicked point.
+
+    :param x: X coordinate of the point.
+    :param y: Y coordinate of the point.
+    :param crs: Coordinate reference system of the point.
+
+    :returns: The parsed response or None if the lookup failed.
+    """
+    cache = get_cache(GEOCODE_CACHE)
+    key = reverse_geocode_key(x, y, crs)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    interactive_requests.begin()
+    try:
+        request = QgsBlockingNetworkRequest()
+        error = request.get(reverse_geocode_request(x, y, crs))
+        if error != QgsBlockingNetworkRequest.NoError:
+            # The error message contains the URL with the API key, so log only the code
+            logger.warning("Reverse geocoding failed with error %s", error)
+            return None
+        result = parse_response(bytes(request.reply().content()))
+    finally:
+        interactive_requests.end()
+
+    if result is not None:
+        cache.put(key, result)
+    return result
+
+
+def reverse_geocode_feature(
+    layer: QgsVectorLayer, feature: QgsFeature
+) -> dict[str, Any] | None:
+    """Look up the address of a feature.
+
+    The lookup uses the same point as prefetching, so prefetched results of
+    selected features are returned without a request.
+
+    :param layer: Layer of the feature.
+    :param feature: The feature.
+
+    :returns: The parsed response or None if the lookup failed.
+    """
+    point = feature_point(feature, geocoding_transform(layer))
+    if point is None:
+        return None
+    return reverse_geocode(point.x(), point.y())
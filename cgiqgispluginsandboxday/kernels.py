@@ -0,0 +1,588 @@
+"""NumPy kernels for post-processing route geometries.
+
+This module must not import qgis or other plugin modules importing it: the
+worker processes of ``workers.RoutePostProcessor`` import it to run the tasks,
+and they should only need NumPy.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from types import TracebackType
+from typing import TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+DEFAULT_TOLERANCE = 1.0
+
+# Odd 64-bit multipliers for mixing the key columns into a hash
+_HASH_MULTIPLIERS = np.array(
+    [0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93],
+    dtype=np.uint64,
+)
+
+
+@dataclass(frozen=True)
+class FlowNetwork:
+    """Deduplicated segments with the flow aggregated over all routes.
+
+    Segments are undirected: a segment traversed A->B and B->A is counted
+    as one segment with two traversals.
+    """
+
+    start: np.ndarray
+    end: np.ndarray
+    count: np.ndarray
+    travel_time: np.ndarray
+
+    def __len__(self) -> int:
+        """Return the number of unique segments."""
+        return len(self.count)
+
+
+def quantize(coordinates: np.ndarray, tolerance: float) -> np.ndarray:
+    """Snap coordinates to an integer grid with the given cell size."""
+    return np.round(coordinates / tolerance).astype(np.int64)
+
+
+def route_segments(
+    routes: Sequence[np.ndarray],
+    travel_times: Sequence[float] | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Break route vertex arrays into segments.
+
+    :param routes: Vertex arrays of shape (n, 2), one per route.
+    :param travel_times: Optional total travel time per route. The time is
+        distributed to the segments of the route in proportion to their length.
+
+    :returns: Start points, end points, travel time and route index of every
+        segment.
+    """
+    lines = [np.asarray(route, dtype=np.float64).reshape(-1, 2) for route in routes]
+    kept = [index for index, line in enumerate(lines) if len(line) > 1]
+    if not kept:
+        empty = np.empty((0, 2), dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64)
+
+    starts = np.concatenate([lines[index][:-1] for index in kept])
+    ends = np.concatenate([lines[index][1:] for index in kept])
+    segment_counts = np.array([len(lines[index]) - 1 for index in kept])
+    route_ids = np.repeat(np.asarray(kept, dtype=np.int64), segment_counts)
+    if travel_times is None:
+        return starts, ends, np.zeros(len(starts), dtype=np.float64), route_ids
+
+    lengths = np.hypot(*(ends - starts).T)
+    totals = np.asarray(travel_times, dtype=np.float64)
+    return starts, ends, distribute_times(lengths, route_ids, totals), route_ids
+
+
+def distribute_times(
+    lengths: np.ndarray, route_ids: np.ndarray, totals: np.ndarray
+) -> np.ndarray:
+    """Distribute the travel time of routes to their segments by length.
+
+    :param lengths: Length of every segment.
+    :param route_ids: Route index of every segment.
+    :param totals: Total travel time of every route.
+
+    :returns: Travel time of every segment.
+    """
+    route_lengths = np.bincount(route_ids, weights=lengths, minlength=len(totals))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(
+            route_lengths[route_ids] > 0, lengths / route_lengths[route_ids], 0.0
+        )
+    return share * totals[route_ids]
+
+
+def segment_keys(
+    starts: np.ndarray, ends: np.ndarray, tolerance: float = DEFAULT_TOLERANCE
+) -> np.ndarray:
+    """Get undirected keys of segments from their quantized endpoints.
+
+    :param starts: Start points of the segments, shape (n, 2).
+    :param ends: End points of the segments, shape (n, 2).
+    :param tolerance: Grid cell size used to snap endpoints.
+
+    :returns: Keys of shape (n, 4) with the lower endpoint first. Both
+        directions of a segment get the same key.
+    """
+    start_keys = quantize(starts, tolerance)
+    end_keys = quantize(ends, tolerance)
+
+    # Order endpoints so that both directions map to the same key
+    swap = (start_keys[:, 0] > end_keys[:, 0]) | (
+        (start_keys[:, 0] == end_keys[:, 0]) & (start_keys[:, 1] > end_keys[:, 1])
+    )
+    low = np.where(swap[:, None], end_keys, start_keys)
+    high = np.where(swap[:, None], start_keys, end_keys)
+    return np.hstack((low, high))
+
+
+def key_hashes(keys: np.ndarray) -> np.ndarray:
+    """Hash the segment keys into a single 64-bit integer per segment."""
+    words = np.ascontiguousarray(keys, dtype=np.int64).view(np.uint64)
+    hashes = np.zeros(len(keys), dtype=np.uint64)
+    for column, multiplier in enumerate(_HASH_MULTIPLIERS):
+        hashes = (hashes ^ words[:, column]) * multiplier
+        hashes ^= hashes >> np.uint64(29)
+    return hashes
+
+
+def count_keys(
+    keys: np.ndarray, travel_times: np.ndarray, hashes: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Count the segments with equal keys.
+
+    The segments are grouped by their key hashes, as sorting the keys row by
+    row is several times slower. If two different keys share a hash, the
+    rows are compared instead.
+
+    :param keys: Segment keys from ``segment_keys``.
+    :param travel_times: Travel time of every segment.
+    :param hashes: Key hashes from ``key_hashes``.
+
+    :returns: The unique keys, their segment counts and summed travel times,
+        and the index of the first segment with each key.
+    """
+    _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    if not np.array_equal(keys[first][inverse], keys):
+        rows = np.ascontiguousarray(keys).view(
+            np.dtype((np.void, keys.itemsize * keys.shape[1]))
+        )
+        _, first, inverse = np.unique(
+            rows.reshape(-1), return_index=True, return_inverse=True
+        )
+        inverse = inverse.reshape(-1)
+
+    counts = np.bincount(inverse, minlength=len(first))
+    times = np.bincount(inverse, weights=travel_times, minlength=len(first))
+    return keys[first], counts, times, first
+
+
+def flow_network(
+    keys: np.ndarray,
+    counts: np.ndarray,
+    travel_times: np.ndarray,
+    first: np.ndarray,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> FlowNetwork:
+    """Create a flow network from counted keys, in order of first occurrence."""
+    order = np.argsort(first)
+    keys = keys[order]
+    return FlowNetwork(
+        start=keys[:, :2] * tolerance,
+        end=keys[:, 2:] * tolerance,
+        count=counts[order],
+        travel_time=travel_times[order],
+    )
+
+
+def move_collapsed_times(
+    keys: np.ndarray,
+    travel_times: np.ndarray,
+    keep: np.ndarray,
+    route_ids: np.ndarray | None = None,
+) -> np.ndarray:
+    """Move the travel time of collapsed segments to touching kept neighbours.
+
+    Only the previous or next kept segment of the same route is accepted, so
+    time is never moved to a segment the route does not drive.
+    """
+    travel_times = np.asarray(travel_times, dtype=np.float64)
+    collapsed = np.flatnonzero(~keep)
+    if len(collapsed) == 0 or not keep.any():
+        return travel_times
+    if route_ids is None:
+        route_ids = np.zeros(len(keys), dtype=np.int64)
+
+    index = np.arange(len(keys))
+    previous = np.maximum.accumulate(np.where(keep, index, -1))[collapsed]
+    following = np.minimum.accumulate(np.where(keep, index, len(keys))[::-1])[::-1][
+        collapsed
+    ]
+    cells = keys[collapsed, :2]
+    routes = route_ids[collapsed]
+
+    def touches(neighbours: np.ndarray) -> np.ndarray:
+        valid = (neighbours >= 0) & (neighbours < len(keys))
+        neighbours = np.clip(neighbours, 0, len(keys) - 1)
+        neighbour_keys = keys[neighbours]
+        return (
+            valid
+            & (route_ids[neighbours] == routes)
+            & (
+                np.all(neighbour_keys[:, :2] == cells, axis=1)
+                | np.all(neighbour_keys[:, 2:] == cells, axis=1)
+            )
+        )
+
+    targets = np.where(
+        touches(previous), previous, np.where(touches(following), following, -1)
+    )
+    moved = targets >= 0
+    travel_times = travel_times.copy()
+    np.add.at(travel_times, targets[moved], travel_times[collapsed[moved]])
+    return travel_times
+
+
+def aggregate_keys(
+    keys: np.ndarray,
+    travel_times: np.ndarray,
+    route_ids: np.ndarray | None = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> FlowNetwork:
+    """Aggregate segments with equal keys.
+
+    The keys are expected in route order, as the travel time of a segment
+    collapsing to a single cell is moved to the previous or next kept segment
+    of the same route touching the cell. The time of a collapsed segment
+    without such a neighbour, e.g. a route shorter than the tolerance, is
+    dropped.
+
+    :param keys: Segment keys from ``segment_keys``.
+    :param travel_times: Travel time of every segment.
+    :param route_ids: Route index of every segment. All segments are treated as
+        one route if not given.
+    :param tolerance: Grid cell size the keys were computed with.
+
+    :returns: The aggregated flow network, segments in order of their first
+        occurrence.
+    """
+    # Segments collapsing to a single cell carry no flow of their own. Their
+    # travel time is moved to a kept neighbouring segment touching that cell.
+    keep = np.any(keys[:, :2] != keys[:, 2:], axis=1)
+    travel_times = move_collapsed_times(keys, travel_times, keep, route_ids)
+
+    kept = np.flatnonzero(keep)
+    unique_keys, counts, times, first = count_keys(
+        keys[kept], travel_times[kept], key_hashes(keys[kept])
+    )
+    return flow_network(unique_keys, counts, times, kept[first], tolerance)
+
+
+def aggregate_segments(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    travel_times: np.ndarray,
+    route_ids: np.ndarray | None = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> FlowNetwork:
+    """Aggregate segments sharing quantized endpoints.
+
+    :param starts: Start points of the segments, shape (n, 2).
+    :param ends: End points of the segments, shape (n, 2).
+    :param travel_times: Travel time of every segment, shape (n,).
+    :param route_ids: Route index of every segment, shape (n,).
+    :param tolerance: Grid cell size used to snap endpoints. Endpoints within
+        the same cell are considered equal.
+
+    :returns: The aggregated flow network.
+    """
+    return aggregate_keys(
+        segment_keys(starts, ends, tolerance), travel_times, route_ids, tolerance
+    )
+
+
+@dataclass(frozen=True)
+class SharedArrayInfo:
+    """Picklable description of a shared array for attaching to it."""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class SharedArray:
+    """NumPy array backed by shared memory."""
+
+    def __init__(
+        self, shape: tuple[int, ...], dtype: str, name: str | None = None
+    ) -> None:
+        """Create a new shared array or attach to an existing one.
+
+        :param shape: Shape of the array.
+        :param dtype: NumPy data type string of the array.
+        :param name: Name of an existing shared memory block to attach to. A new
+            block is created if not given.
+        """
+        self._owner = name is None
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        self._memory = shared_memory.SharedMemory(
+            name=name, create=self._owner, size=size if self._owner else 0
+        )
+        self.array: np.ndarray | None = np.ndarray(
+            shape, dtype=dtype, buffer=self._memory.buf
+        )
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> SharedArray:
+        """Create a shared copy of the array."""
+        shared = cls(array.shape, array.dtype.str)
+        shared.array[...] = array  # type: ignore[index]
+        return shared
+
+    @classmethod
+    def attach(cls, info: SharedArrayInfo) -> SharedArray:
+        """Attach to a shared array created in another process."""
+        return cls(info.shape, info.dtype, info.name)
+
+    @property
+    def info(self) -> SharedArrayInfo:
+        """Get the description for attaching to the array."""
+        if self.array is None:
+            raise RuntimeError("The shared array has been closed")
+        return SharedArrayInfo(
+            self._memory.name, self.array.shape, self.array.dtype.str
+        )
+
+    def close(self, *, unlink: bool | None = None) -> None:
+        """Release the array.
+
+        :param unlink: Whether to free the memory. Defaults to freeing it if
+            this process created the array.
+        """
+        # The array must be released before the buffer can be closed
+        self.array = None
+        self._memory.close()
+        if self._owner if unlink is None else unlink:
+            self._memory.unlink()
+
+    def __enter__(self) -> SharedArray:  # noqa: PYI034
+        """Enter the context."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Release the array when leaving the context."""
+        self.close()
+
+
+def share_result(array: np.ndarray) -> SharedArrayInfo:
+    """Copy a result of a worker into shared memory handed over to the caller.
+
+    The memory is left allocated until the caller takes the array over with
+    ``take_shared``.
+    """
+    shared = SharedArray.from_array(array)
+    info = shared.info
+    shared.close(unlink=False)
+    return info
+
+
+def take_shared(info: SharedArrayInfo) -> np.ndarray:
+    """Copy an array handed over by a worker and free its shared memory."""
+    shared = SharedArray.attach(info)
+    try:
+        return shared.array.copy()  # type: ignore[union-attr]
+    finally:
+        shared.close(unlink=True)
+
+
+def pack_lines(lines: Sequence[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Pack line vertex arrays into one coordinate array and line offsets.
+
+    :returns: Coordinates of shape (n, 2) and offsets of shape (lines + 1,)
+        where the vertices of line i are ``coordinates[offsets[i]:offsets[i + 1]]``.
+    """
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(line) for line in lines])
+    if not lines:
+        return np.empty((0, 2), dtype=np.float64), offsets
+    coordinates = np.concatenate(
+        [np.asarray(line, dtype=np.float64).reshape(-1, 2) for line in lines]
+    )
+    return coordinates, offsets
+
+
+def unpack_lines(coordinates: np.ndarray, offsets: np.ndarray) -> list[np.ndarray]:
+    """Split packed coordinates back into line vertex arrays."""
+    return [
+        coordinates[start:end].copy() for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+
+
+def chunk_lines(offsets: np.ndarray, count: int) -> list[tuple[int, int]]:
+    """Split lines into ranges with roughly equal number of vertices."""
+    line_count = len(offsets) - 1
+    if line_count <= 0:
+        return []
+    targets = np.linspace(0, offsets[-1], count + 1)
+    bounds = np.unique(
+        np.concatenate(([0], np.searchsorted(offsets, targets[1:-1]), [line_count]))
+    )
+    return [(int(first), int(last)) for first, last in zip(bounds[:-1], bounds[1:])]
+
+
+def run_attached(
+    task: Callable[..., T], infos: Sequence[SharedArrayInfo], *args: object
+) -> T:
+    """Run a task on shared arrays attached in a worker process."""
+    shared = [SharedArray.attach(info) for info in infos]
+    try:
+        return task(*[array.array for array in shared], *args)
+    finally:
+        for array in shared:
+            array.close()
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Get the mask of vertices kept by Douglas-Peucker simplification."""
+    keep = np.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return keep
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:  # noqa: PLR2004
+            continue
+        start, end = points[first], points[last]
+        direction = end - start
+        norm = np.hypot(*direction)
+        between = points[first + 1 : last] - start
+        if norm == 0:
+            distances = np.hypot(*between.T)
+        else:
+            distances = (
+                np.abs(direction[0] * between[:, 1] - direction[1] * between[:, 0])
+                / norm
+            )
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.extend(((first, split), (split, last)))
+    return keep
+
+
+def simplify_task(
+    coordinates: np.ndarray,
+    offsets: np.ndarray,
+    keep: np.ndarray,
+    first: int,
+    last: int,
+    tolerance: float,
+) -> None:
+    """Mark the vertices kept by simplifying lines first to last."""
+    for start, end in zip(offsets[first:last], offsets[first + 1 : last + 1]):
+        keep[start:end] = douglas_peucker(coordinates[start:end], tolerance)
+
+
+def segment_task(
+    coordinates: np.ndarray,
+    offsets: np.ndarray,
+    totals: np.ndarray,
+    keys: np.ndarray,
+    travel_times: np.ndarray,
+    hashes: np.ndarray,
+    keep: np.ndarray,
+    first: int,
+    last: int,
+    tolerance: float,
+) -> None:
+    """Write the keys, hashes and travel times of the segments of lines first to last.
+
+    All segments of a line are in the same chunk, so the travel time of
+    collapsed segments is moved to their neighbours here.
+    """
+    points = coordinates[offsets[first] : offsets[last]]
+    # Drop the segments joining the last vertex of a line to the next line
+    is_segment = np.ones(max(len(points) - 1, 0), dtype=bool)
+    is_segment[offsets[first + 1 : last] - offsets[first] - 1] = False
+    starts = points[:-1][is_segment]
+    ends = points[1:][is_segment]
+    route_ids = np.repeat(
+        np.arange(last - first), np.diff(offsets[first : last + 1]) - 1
+    )
+
+    chunk_keys = segment_keys(starts, ends, tolerance)
+    chunk_keep = np.any(chunk_keys[:, :2] != chunk_keys[:, 2:], axis=1)
+    chunk_times = distribute_times(
+        np.hypot(*(ends - starts).T), route_ids, totals[first:last]
+    )
+
+    # Line i has offsets[i + 1] - offsets[i] - 1 segments
+    segment_first = offsets[first] - first
+    segment_last = segment_first + len(starts)
+    keys[segment_first:segment_last] = chunk_keys
+    hashes[segment_first:segment_last] = key_hashes(chunk_keys)
+    keep[segment_first:segment_last] = chunk_keep
+    travel_times[segment_first:segment_last] = move_collapsed_times(
+        chunk_keys, chunk_times, chunk_keep, route_ids
+    )
+
+
+def count_task(
+    keys: np.ndarray,
+    travel_times: np.ndarray,
+    hashes: np.ndarray,
+    keep: np.ndarray,
+    bucket: int,
+    bucket_count: int,
+) -> tuple[SharedArrayInfo, ...]:
+    """Count the kept segments whose key hash falls in the bucket.
+
+    Equal keys have equal hashes, so every key is counted in one bucket only.
+
+    :returns: Shared unique keys, segment counts, travel times and first
+        segment indices, see ``count_keys``.
+    """
+    indices = np.flatnonzero(keep & (hashes % np.uint64(bucket_count) == bucket))
+    unique_keys, counts, times, first = count_keys(
+        keys[indices], travel_times[indices], hashes[indices]
+    )
+    return tuple(
+        share_result(array) for array in (unique_keys, counts, times, indices[first])
+    )
+
+
+def matrix_task(
+    origins: np.ndarray,
+    destinations: np.ndarray,
+    values: np.ndarray,
+    matrix: np.ndarray,
+    first: int,
+    last: int,
+) -> None:
+    """Write the results first to last into the matrix."""
+    matrix[origins[first:last], destinations[first:last]] = values[first:last]
+
+
+def _decode_parts(text: str) -> list[np.ndarray]:
+    """Decode a GeoJSON line geometry into the vertex arrays of its parts."""
+    geometry = json.loads(text)
+    if geometry.get("type") == "MultiLineString":
+        parts = geometry["coordinates"]
+    else:
+        parts = [geometry["coordinates"]]
+    return [
+        np.asarray(part, dtype=np.float64)[:, :2]
+        if part
+        else np.empty((0, 2), dtype=np.float64)
+        for part in parts
+    ]
+
+
+def decode_task(texts: Sequence[str]) -> tuple[SharedArrayInfo, ...]:
+    """Decode GeoJSON line geometries into shared arrays.
+
+    Every part of a multi-part geometry is a line of its own.
+
+    :returns: Shared coordinates and line offsets of the parts, see
+        ``pack_lines``, and the number of parts of every geometry.
+    """
+    geometries = [_decode_parts(text) for text in texts]
+    coordinates, offsets = pack_lines([part for parts in geometries for part in parts])
+    part_counts = np.array([len(parts) for parts in geometries], dtype=np.int64)
+    return tuple(share_result(array) for array in (coordinates, offsets, part_counts))
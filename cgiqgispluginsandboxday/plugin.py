@@ -4,12 +4,21 @@ from __future__ import annotations
 
 from collections.abc import Callable
 
+from qgis.core import QgsMapLayerType, QgsProject, QgsWkbTypes
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QWidget
 from qgis.utils import iface
 
 from cgiqgispluginsandboxday.constants import PLUGIN_NAME
+from cgiqgispluginsandboxday.flow import create_flow_layer
 from cgiqgispluginsandboxday.logger import get_logger, remove_logger
+from cgiqgispluginsandboxday.prefetch import (
+    ReverseGeocodePrefetcher,
+    is_enabled,
+    set_enabled,
+)
+from cgiqgispluginsandboxday.session import install_exit_hook
+from cgiqgispluginsandboxday.workers import RoutePostProcessor
 
 logger = get_logger()
 
@@ -23,6 +32,8 @@ class Plugin:
         """Initialize the plugin."""
         self.actions: list[QAction] = []
         self.menu = Plugin.name
+        self.prefetcher: ReverseGeocodePrefetcher | None = None
+        self._post_processor: RoutePostProcessor | None = None
 
     def add_action(
         self,
@@ -91,6 +102,8 @@ class Plugin:
 
     def initGui(self) -> None:  # noqa N802
         """Create the menu entries and toolbar icons inside the QGIS GUI."""
+        install_exit_hook()
+
         self.add_action(
             "",
             text=Plugin.name,
@@ -98,18 +111,97 @@ class Plugin:
             parent=iface.mainWindow(),
             add_to_toolbar=False,
         )
+        self.add_action(
+            "",
+            text="Aggregate route flow",
+            callback=self.aggregate_flow,
+            parent=iface.mainWindow(),
+            add_to_toolbar=False,
+            status_tip="Aggregate the routes of the active layer into a flow network",
+        )
+        prefetch_action = self.add_action(
+            "",
+            text="Prefetch addresses of selected features",
+            callback=self.toggle_prefetch,
+            parent=iface.mainWindow(),
+            add_to_toolbar=False,
+            status_tip="Look up addresses of visible selected features in the background",
+        )
+        prefetch_action.setCheckable(True)
+
+        self.prefetcher = ReverseGeocodePrefetcher(iface.mapCanvas())
+        if is_enabled():
+            prefetch_action.setChecked(True)
+            self.prefetcher.start()
 
     def onClosePlugin(self) -> None:  # noqa N802
         """Cleanup necessary items here when plugin dockwidget is closed."""
 
     def unload(self) -> None:
-        """Remove the plugin menu item and icon from QGIS GUI."""
+        """Remove the plugin menu item and icon from QGIS GUI.
+
+        The session state is left in place so caches stay warm when the plugin
+        is reloaded.
+        """
         for action in self.actions:
             iface.removePluginMenu(Plugin.name, action)
             iface.removeToolBarIcon(action)
 
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+
+        if self._post_processor is not None:
+            self._post_processor.shutdown()
+            self._post_processor = None
+
         remove_logger()
 
+    @property
+    def post_processor(self) -> RoutePostProcessor | None:
+        """Process pool for post-processing routes, created on first use.
+
+        None if the worker processes cannot be started, in which case the
+        routes are processed in the QGIS process.
+        """
+        if self._post_processor is None:
+            try:
+                self._post_processor = RoutePostProcessor()
+            except RuntimeError:
+                logger.warning("Unable to start worker processes", exc_info=True)
+        return self._post_processor
+
+    def toggle_prefetch(self, checked: bool) -> None:
+        """Enable or disable prefetching addresses in the background."""
+        set_enabled(checked)
+        if self.prefetcher is None:
+            return
+
+        if checked:
+            self.prefetcher.start()
+        else:
+            self.prefetcher.stop()
+
     def run(self) -> None:
         """Run method that performs all the real work."""
         logger.info("Heipä hei parahin QGIS-hiekkalaatikkoilija")
+
+    def aggregate_flow(self) -> None:
+        """Add a flow network aggregated from the routes of the active layer."""
+        layer = iface.activeLayer()
+        if (
+            layer is None
+            or layer.type() != QgsMapLayerType.VectorLayer
+            or layer.geometryType() != QgsWkbTypes.LineGeometry
+        ):
+            logger.warning("Select a route line layer to aggregate")
+            return
+
+        travel_time_field = (
+            "travel_time" if "travel_time" in layer.fields().names() else None
+        )
+        QgsProject.instance().addMapLayer(
+            create_flow_layer(
+                layer, travel_time_field, post_processor=self.post_processor
+            )
+        )
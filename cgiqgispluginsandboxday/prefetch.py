@@ -0,0 +1,243 @@
+"""Background prefetching of reverse geocoding results.
+
+When the map canvas extent settles or the selection of a layer changes, the
+selected features visible on the canvas are queued for reverse geocoding in
+the background. The results are stored in the geocoding cache so a later
+lookup of the feature with ``geocoding.reverse_geocode_feature`` is answered
+without a request.
+
+Prefetching is opt-in. Requests are sent one at a time with low network
+priority, pause while interactive requests are in flight, and are limited to
+a number of requests per minute.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsFeatureRequest,
+    QgsMapLayer,
+    QgsMapLayerType,
+    QgsNetworkAccessManager,
+    QgsProject,
+    QgsSettings,
+)
+from qgis.gui import QgsMapCanvas
+from qgis.PyQt.QtCore import QObject, QTimer
+from qgis.PyQt.QtNetwork import QNetworkReply, QNetworkRequest
+
+from cgiqgispluginsandboxday.cache import GEOCODE_CACHE, get_cache
+from cgiqgispluginsandboxday.constants import SETTINGS_PREFIX
+from cgiqgispluginsandboxday.geocoding import (
+    feature_point,
+    geocoding_transform,
+    interactive_requests,
+    parse_response,
+    reverse_geocode_key,
+    reverse_geocode_request,
+)
+from cgiqgispluginsandboxday.logger import get_logger
+
+logger = get_logger()
+
+ENABLED_SETTING = f"{SETTINGS_PREFIX}/prefetch/enabled"
+BUDGET_SETTING = f"{SETTINGS_PREFIX}/prefetch/requests_per_minute"
+
+DEFAULT_REQUESTS_PER_MINUTE = 30
+SETTLE_DELAY_MS = 500
+MAX_QUEUED_POINTS = 500
+BUDGET_WINDOW_S = 60.0
+
+
+def is_enabled() -> bool:
+    """Whether prefetching has been enabled by the user."""
+    return QgsSettings().value(ENABLED_SETTING, defaultValue=False, type=bool)
+
+
+def set_enabled(enabled: bool) -> None:
+    """Store whether prefetching is enabled."""
+    QgsSettings().setValue(ENABLED_SETTING, enabled)
+
+
+class ReverseGeocodePrefetcher(QObject):
+    """Prefetches reverse geocoding results for visible selected features."""
+
+    def __init__(self, canvas: QgsMapCanvas, parent: QObject | None = None) -> None:
+        """Initialize the prefetcher.
+
+        :param canvas: Map canvas whose extent and selections are followed.
+        :param parent: Parent object.
+        """
+        super().__init__(parent)
+        self.canvas = canvas
+        # Prefetching is disabled with the enabled setting, not with a zero budget
+        self.requests_per_minute = max(
+            1,
+            QgsSettings().value(
+                BUDGET_SETTING, defaultValue=DEFAULT_REQUESTS_PER_MINUTE, type=int
+            ),
+        )
+        self.running = False
+
+        self._queue: deque[tuple[float, float]] = deque()
+        self._sent_times: deque[float] = deque()
+        self._reply: QNetworkReply | None = None
+        self._reply_point: tuple[float, float] | None = None
+
+        self._settle_timer = QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.setInterval(SETTLE_DELAY_MS)
+        self._settle_timer.timeout.connect(self._queue_visible)
+
+        self._budget_timer = QTimer(self)
+        self._budget_timer.setSingleShot(True)
+        self._budget_timer.timeout.connect(self._dispatch)
+
+    def start(self) -> None:
+        """Start following the canvas."""
+        if self.running:
+            return
+
+        self.canvas.extentsChanged.connect(self._settle_timer.start)
+        self.canvas.selectionChanged.connect(self._on_selection_changed)
+        interactive_requests.started.connect(self._yield)
+        interactive_requests.finished.connect(self._dispatch)
+        self.running = True
+        self._settle_timer.start()
+
+    def stop(self) -> None:
+        """Stop following the canvas and cancel the queued lookups."""
+        if not self.running:
+            return
+
+        self.canvas.extentsChanged.disconnect(self._settle_timer.start)
+        self.canvas.selectionChanged.disconnect(self._on_selection_changed)
+        interactive_requests.started.disconnect(self._yield)
+        interactive_requests.finished.disconnect(self._dispatch)
+        self.running = False
+        self.cancel()
+
+    def cancel(self) -> None:
+        """Cancel the queued and running lookups."""
+        self._settle_timer.stop()
+        self._budget_timer.stop()
+        self._queue.clear()
+        self._abort_reply()
+
+    def _on_selection_changed(self, layer: QgsMapLayer) -> None:
+        self._settle_timer.start()
+
+    def _queue_visible(self) -> None:
+        """Replace the queue with the visible selected features."""
+        self._queue.clear()
+        cache = get_cache(GEOCODE_CACHE)
+        settings = self.canvas.mapSettings()
+        extent = self.canvas.extent()
+
+        for layer in self.canvas.layers():
+            if len(self._queue) >= MAX_QUEUED_POINTS:
+                break
+            if (
+                layer.type() != QgsMapLayerType.VectorLayer
+                or layer.selectedFeatureCount() == 0
+            ):
+                continue
+
+            to_layer = QgsCoordinateTransform(
+                settings.destinationCrs(), layer.crs(), QgsProject.instance()
+            )
+            try:
+                layer_extent = to_layer.transformBoundingBox(extent)
+            except QgsCsException:
+                # E.g. a world scale extent outside the valid area of the layer CRS
+                continue
+
+            to_target = geocoding_transform(layer)
+            request = (
+                QgsFeatureRequest()
+                .setFilterFids(layer.selectedFeatureIds())
+                .setFilterRect(layer_extent)
+                .setNoAttributes()
+            )
+            for feature in layer.getFeatures(request):
+                point = feature_point(feature, to_target)
+                if point is None:
+                    continue
+                if reverse_geocode_key(point.x(), point.y()) in cache:
+                    continue
+                self._queue.append((point.x(), point.y()))
+                if len(self._queue) >= MAX_QUEUED_POINTS:
+                    break
+
+        if self._queue:
+            logger.info("Queued %d points for address prefetch", len(self._queue))
+        self._dispatch()
+
+    def _budget_wait(self) -> float:
+        """Get the seconds to wait until the budget allows another request."""
+        now = time.monotonic()
+        while self._sent_times and now - self._sent_times[0] >= BUDGET_WINDOW_S:
+            self._sent_times.popleft()
+        if len(self._sent_times) < self.requests_per_minute:
+            return 0.0
+        return BUDGET_WINDOW_S - (now - self._sent_times[0])
+
+    def _dispatch(self) -> None:
+        """Send the next queued lookup if nothing else is in the way."""
+        if (
+            not self.running
+            or self._reply is not None
+            or not self._queue
+            or interactive_requests.active
+        ):
+            return
+
+        wait = self._budget_wait()
+        if wait > 0:
+            if not self._budget_timer.isActive():
+                self._budget_timer.start(int(wait * 1000) + 1)
+            return
+
+        x, y = self._queue.popleft()
+        request = reverse_geocode_request(x, y)
+        request.setPriority(QNetworkRequest.LowPriority)
+        self._sent_times.append(time.monotonic())
+        self._reply_point = (x, y)
+        self._reply = QgsNetworkAccessManager.instance().get(request)
+        self._reply.finished.connect(self._on_finished)
+
+    def _on_finished(self) -> None:
+        reply, point = self._reply, self._reply_point
+        self._reply = None
+        self._reply_point = None
+        if reply is None or point is None:
+            return
+
+        if reply.error() == QNetworkReply.NoError:
+            result = parse_response(bytes(reply.readAll()))
+            if result is not None:
+                get_cache(GEOCODE_CACHE).put(reverse_geocode_key(*point), result)
+        elif reply.error() != QNetworkReply.OperationCanceledError:
+            logger.warning("Address prefetch failed with error %s", reply.error())
+        reply.deleteLater()
+
+        self._dispatch()
+
+    def _yield(self) -> None:
+        """Give way to an interactive request, retrying the lookup later."""
+        if self._reply_point is not None:
+            self._queue.appendleft(self._reply_point)
+        self._abort_reply()
+
+    def _abort_reply(self) -> None:
+        reply = self._reply
+        self._reply = None
+        self._reply_point = None
+        if reply is not None:
+            reply.finished.disconnect(self._on_finished)
+            reply.abort()
+            reply.deleteLater()
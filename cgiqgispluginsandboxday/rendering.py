@@ -0,0 +1,172 @@
+"""Progressive rendering of route results."""
+
+from __future__ import annotations
+
+from qgis.core import (
+    QgsFeature,
+    QgsField,
+    QgsGeometry,
+    QgsPointXY,
+    QgsVectorLayer,
+)
+from qgis.PyQt.QtCore import QObject, QTimer, QVariant
+
+from cgiqgispluginsandboxday.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_REFRESH_INTERVAL_MS = 250
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+
+
+class ProgressiveRouteLayer(QObject):
+    """Route layer drawing placeholders first and results as they arrive.
+
+    Every route is drawn as a straight line between its end points as soon as
+    it is queued. The line is replaced with the real geometry when the result
+    arrives. Layer edits are collected and written with a single provider call
+    per refresh interval, followed by a single repaint of the layer, so that
+    results arriving in quick succession do not each trigger a redraw.
+
+    The methods must be called from the main thread, e.g. from the finished
+    handler of a QgsTask. If the layer is removed from the project while
+    results are still arriving, further results are ignored.
+    """
+
+    def __init__(
+        self,
+        crs: str,
+        name: str = "Routes",
+        refresh_interval_ms: int = DEFAULT_REFRESH_INTERVAL_MS,
+        parent: QObject | None = None,
+    ) -> None:
+        """Initialize the layer.
+
+        :param crs: Authority identifier of the layer CRS, e.g. "EPSG:3067".
+        :param name: Name of the layer.
+        :param refresh_interval_ms: Interval for writing queued edits.
+        :param parent: Parent object.
+        """
+        super().__init__(parent)
+        self.layer = QgsVectorLayer(f"LineString?crs={crs}", name, "memory")
+        self.layer.dataProvider().addAttributes(
+            [
+                QgsField("route_id", QVariant.String),
+                QgsField("status", QVariant.String),
+                QgsField("travel_time", QVariant.Double),
+                QgsField("length", QVariant.Double),
+            ]
+        )
+        self.layer.updateFields()
+
+        self._feature_ids: dict[str, int] = {}
+        self._pending_features: dict[str, QgsFeature] = {}
+        self._pending_geometries: dict[int, QgsGeometry] = {}
+        self._pending_attributes: dict[int, dict[int, object]] = {}
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(refresh_interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+        self._layer_deleted = False
+        self.layer.willBeDeleted.connect(self._on_layer_deleted)
+
+    def _on_layer_deleted(self) -> None:
+        """Drop the queued edits when the layer is removed while results arrive."""
+        self._layer_deleted = True
+        self._timer.stop()
+        self._pending_features.clear()
+        self._pending_geometries = {}
+        self._pending_attributes = {}
+
+    def add_placeholder(
+        self, route_id: str, start: QgsPointXY, end: QgsPointXY
+    ) -> None:
+        """Queue a straight line placeholder for a route."""
+        if self._layer_deleted:
+            return
+
+        feature = QgsFeature(self.layer.fields())
+        feature.setGeometry(QgsGeometry.fromPolylineXY([start, end]))
+        feature.setAttributes([route_id, STATUS_PENDING, None, None])
+        self._pending_features[route_id] = feature
+        self._schedule()
+
+    def set_result(
+        self,
+        route_id: str,
+        geometry: QgsGeometry,
+        travel_time: float | None = None,
+        length: float | None = None,
+    ) -> None:
+        """Queue replacing the placeholder of a route with the real geometry."""
+        if self._layer_deleted:
+            return
+
+        fields = self.layer.fields()
+        attributes: dict[int, object] = {
+            fields.indexOf("status"): STATUS_DONE,
+            fields.indexOf("travel_time"): travel_time,
+            fields.indexOf("length"): length,
+        }
+
+        if route_id in self._pending_features:
+            # The placeholder has not been written yet, write the result instead
+            feature = self._pending_features[route_id]
+            feature.setGeometry(geometry)
+            for index, value in attributes.items():
+                feature.setAttribute(index, value)
+        elif route_id in self._feature_ids:
+            feature_id = self._feature_ids[route_id]
+            self._pending_geometries[feature_id] = geometry
+            self._pending_attributes[feature_id] = attributes
+        else:
+            feature = QgsFeature(fields)
+            feature.setGeometry(geometry)
+            feature.setAttributes([route_id, STATUS_DONE, travel_time, length])
+            self._pending_features[route_id] = feature
+
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Write all queued edits and repaint the layer once."""
+        self._timer.stop()
+        if self._layer_deleted or not (
+            self._pending_features
+            or self._pending_geometries
+            or self._pending_attributes
+        ):
+            return
+
+        provider = self.layer.dataProvider()
+
+        if self._pending_features:
+            route_ids = list(self._pending_features)
+            success, features = provider.addFeatures(
+                list(self._pending_features.values())
+            )
+            if success:
+                for route_id, feature in zip(route_ids, features):
+                    self._feature_ids[route_id] = feature.id()
+            else:
+                logger.warning("Unable to add %d route features", len(route_ids))
+            self._pending_features.clear()
+
+        if self._pending_geometries:
+            provider.changeGeometryValues(self._pending_geometries)
+            self._pending_geometries = {}
+
+        if self._pending_attributes:
+            provider.changeAttributeValues(self._pending_attributes)
+            self._pending_attributes = {}
+
+        self.layer.updateExtents()
+        # Repaints only this layer instead of refreshing the whole canvas
+        self.layer.triggerRepaint()
@@ -0,0 +1,180 @@
+"""Session state surviving plugin reloads and QGIS restarts.
+
+Plugin Reloader removes the plugin modules from ``sys.modules`` and imports
+them again, so module level caches start cold after every reload. The state
+here is kept in a separate module object registered in ``sys.modules`` under a
+name that does not belong to the plugin package, so it is left alone by the
+reloader.
+
+Persistent entries are additionally written to the QGIS profile directory when
+QGIS exits and restored lazily on first access after the next start. They
+must be plain data such as dicts, tuples and strings: instances of plugin
+classes cannot be pickled after Plugin Reloader has replaced the classes.
+Entries like network sessions or connection pools should be registered as
+non-persistent.
+"""
+
+from __future__ import annotations
+
+import pickle
+import sys
+import types
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TypeVar
+
+from qgis.core import QgsApplication
+
+from cgiqgispluginsandboxday.logger import get_logger
+
+logger = get_logger()
+
+T = TypeVar("T")
+
+SESSION_MODULE_NAME = "_cgiqgispluginsandboxday_session"
+SNAPSHOT_FILE_NAME = "session.pickle"
+
+
+@dataclass
+class _SessionState:
+    """State kept in the session module.
+
+    An instance created before a plugin reload is of the replaced class, so
+    fields must not be removed or renamed.
+    """
+
+    values: dict[str, Any] = field(default_factory=dict)
+    persistent: set[str] = field(default_factory=set)
+    snapshot: dict[str, Any] | None = None
+    exit_hook_installed: bool = False
+
+
+def _store() -> _SessionState:
+    """Get the session state, creating the module holding it if needed."""
+    module = sys.modules.get(SESSION_MODULE_NAME)
+    if module is None:
+        module = types.ModuleType(SESSION_MODULE_NAME)
+        module.state = _SessionState()  # type: ignore[attr-defined]
+        sys.modules[SESSION_MODULE_NAME] = module
+
+    state: _SessionState = module.state  # type: ignore[attr-defined]
+    return state
+
+
+def snapshot_path() -> Path:
+    """Get the path of the session snapshot in the QGIS profile directory."""
+    return (
+        Path(QgsApplication.qgisSettingsDirPath())
+        / "cgiqgispluginsandboxday"
+        / SNAPSHOT_FILE_NAME
+    )
+
+
+def _load_snapshot() -> dict[str, Any]:
+    """Load the snapshot written on the previous exit, only once per session."""
+    store = _store()
+    if store.snapshot is None:
+        store.snapshot = {}
+        path = snapshot_path()
+        if path.is_file():
+            try:
+                with path.open("rb") as file:
+                    # The snapshot is written by this plugin to the user's own profile
+                    pickled = pickle.load(file)  # noqa: S301
+                store.snapshot = {
+                    name: pickle.loads(value)  # noqa: S301
+                    for name, value in pickled.items()
+                }
+            except Exception:
+                logger.exception("Unable to restore session snapshot")
+            else:
+                logger.info("Restored session snapshot from %s", path)
+
+    return store.snapshot
+
+
+def get_state(name: str, factory: Callable[[], T], *, persistent: bool = False) -> T:
+    """Get a named session state entry, creating it on first use.
+
+    :param name: Name of the entry.
+    :param factory: Called to create the entry if it does not exist yet.
+    :param persistent: Whether to snapshot the entry to disk on QGIS exit and
+        restore it on the next start.
+
+    :returns: The session state entry.
+    """
+    store = _store()
+    if name not in store.values:
+        snapshot = _load_snapshot() if persistent else {}
+        store.values[name] = snapshot.pop(name) if name in snapshot else factory()
+    if persistent:
+        store.persistent.add(name)
+
+    return store.values[name]
+
+
+def save_snapshot() -> None:
+    """Write the persistent session state entries to disk."""
+    store = _store()
+    entries = {
+        name: store.values[name] for name in store.persistent if name in store.values
+    }
+    if not entries:
+        return
+
+    # Pickle the entries one by one so that a single bad entry does not
+    # prevent saving the rest
+    pickled = {}
+    for name, value in entries.items():
+        try:
+            pickled[name] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            logger.exception("Unable to save session state entry %s", name)
+
+    path = snapshot_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp")
+        with temporary_path.open("wb") as file:
+            pickle.dump(pickled, file, protocol=pickle.HIGHEST_PROTOCOL)
+        temporary_path.replace(path)
+    except Exception:
+        logger.exception("Unable to save session snapshot")
+    else:
+        logger.info("Saved session snapshot to %s", path)
+
+
+def _save_snapshot_on_exit() -> None:
+    """Save the snapshot with the currently loaded session module.
+
+    The exit hook stays connected across plugin reloads, so the module is
+    looked up on exit instead of calling the ``save_snapshot`` of the module
+    that installed the hook.
+    """
+    module = sys.modules.get(__name__)
+    if module is not None:
+        module.save_snapshot()
+
+
+def install_exit_hook() -> None:
+    """Save the session snapshot when QGIS exits.
+
+    The hook is installed only once per QGIS session, also across plugin
+    reloads.
+    """
+    store = _store()
+    if store.exit_hook_installed:
+        return
+
+    QgsApplication.instance().aboutToQuit.connect(_save_snapshot_on_exit)
+    store.exit_hook_installed = True
+
+
+def clear_session() -> None:
+    """Drop all session state entries and the snapshot on disk."""
+    store = _store()
+    store.values.clear()
+    store.persistent.clear()
+    store.snapshot = {}
+    snapshot_path().unlink(missing_ok=True)
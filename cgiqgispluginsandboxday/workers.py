@@ -0,0 +1,323 @@
+"""Process pool for CPU heavy post-processing of route results.
+
+Route geometries are packed into a single coordinate array with line offsets
+and placed in shared memory. Worker processes attach to the shared buffers and
+write their results into shared output buffers, or hand over shared buffers
+of their own when the result size is not known in advance, so coordinates are
+not pickled between the processes. Only combining the results and the final
+layer writes are left to the QGIS process.
+
+The workers run the NumPy kernels of the ``kernels`` module and do not import
+qgis.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from multiprocessing import get_context, spawn
+from pathlib import Path
+
+import numpy as np
+
+from cgiqgispluginsandboxday.kernels import (
+    DEFAULT_TOLERANCE,
+    FlowNetwork,
+    SharedArray,
+    SharedArrayInfo,
+    chunk_lines,
+    count_task,
+    decode_task,
+    flow_network,
+    matrix_task,
+    pack_lines,
+    run_attached,
+    segment_task,
+    simplify_task,
+    take_shared,
+    unpack_lines,
+)
+from cgiqgispluginsandboxday.logger import get_logger
+
+logger = get_logger()
+
+CHUNKS_PER_WORKER = 4
+
+
+def _python_executable() -> str:
+    """Get the absolute path of the Python interpreter for the worker processes.
+
+    In QGIS ``sys.executable`` usually points to the QGIS binary, so the
+    interpreter of the Python installation QGIS runs on is looked up instead.
+    multiprocessing does not search PATH, so the path must be absolute.
+
+    :raises RuntimeError: If no interpreter is found.
+    """
+    executable = Path(sys.executable)
+    version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    candidates = []
+    if executable.name.lower().startswith("python"):
+        candidates.append(executable)
+
+    if sys.platform == "win32":
+        # pythonw avoids opening a console window for every worker
+        candidates += [
+            Path(sys.exec_prefix) / "pythonw.exe",
+            Path(sys.exec_prefix) / "python.exe",
+        ]
+    else:
+        candidates += [
+            Path(sys.exec_prefix) / "bin" / f"python{version}",
+            Path(sys.exec_prefix) / "bin" / "python3",
+            # QGIS app bundle on macOS
+            executable.parent / "bin" / f"python{version}",
+            executable.parent / "bin" / "python3",
+        ]
+        found = shutil.which(f"python{version}")
+        if found is not None:
+            candidates.append(Path(found))
+
+    for candidate in candidates:
+        if (
+            candidate.is_absolute()
+            and candidate.is_file()
+            and os.access(candidate, os.X_OK)
+        ):
+            return str(candidate)
+
+    raise RuntimeError("Unable to find the Python interpreter for worker processes")
+
+
+@contextmanager
+def _spawn_executable(executable: str) -> Iterator[None]:
+    """Spawn processes with the executable within the context.
+
+    multiprocessing keeps one spawn executable for the whole process, so the
+    previous one is restored afterwards to not affect other multiprocessing
+    users in QGIS.
+    """
+    previous = spawn.get_executable()
+    spawn.set_executable(executable)
+    try:
+        yield
+    finally:
+        spawn.set_executable(previous)
+
+
+class RoutePostProcessor:
+    """Process pool for post-processing route results off the main interpreter.
+
+    The worker processes are started on first use and stopped with
+    ``shutdown``.
+    """
+
+    def __init__(self, max_workers: int | None = None) -> None:
+        """Initialize the pool.
+
+        :param max_workers: Number of worker processes. Defaults to the number
+            of CPUs.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executable = _python_executable()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=get_context("spawn")
+        )
+
+    def _spawning(self) -> ExitStack:
+        """Get a context in which processes are spawned with the right interpreter.
+
+        Both the workers and the multiprocessing resource tracker, started
+        when shared memory is first created, are spawned lazily.
+        """
+        stack = ExitStack()
+        stack.enter_context(_spawn_executable(self._executable))
+        return stack
+
+    def _map_chunks(
+        self,
+        task: Callable[..., None],
+        infos: Sequence[SharedArrayInfo],
+        chunks: Sequence[tuple[int, int]],
+        *args: object,
+    ) -> None:
+        futures = [
+            self._executor.submit(run_attached, task, infos, first, last, *args)
+            for first, last in chunks
+        ]
+        for future in futures:
+            future.result()
+
+    def decode(self, texts: Sequence[str]) -> list[list[np.ndarray]]:
+        """Decode GeoJSON line geometries into vertex arrays.
+
+        :param texts: GeoJSON LineString or MultiLineString geometries.
+
+        :returns: The vertex arrays of the parts of every geometry.
+        """
+        chunk_size = max(1, -(-len(texts) // (self.max_workers * CHUNKS_PER_WORKER)))
+        chunks = [
+            texts[start : start + chunk_size]
+            for start in range(0, len(texts), chunk_size)
+        ]
+
+        geometries: list[list[np.ndarray]] = []
+        with self._spawning():
+            futures = [self._executor.submit(decode_task, chunk) for chunk in chunks]
+            for future in futures:
+                coordinates, offsets, part_counts = (
+                    take_shared(info) for info in future.result()
+                )
+                lines = unpack_lines(coordinates, offsets)
+                part_offsets = np.concatenate(([0], np.cumsum(part_counts)))
+                geometries.extend(
+                    lines[start:end]
+                    for start, end in zip(part_offsets[:-1], part_offsets[1:])
+                )
+
+        return geometries
+
+    def simplify(
+        self, lines: Sequence[np.ndarray], tolerance: float
+    ) -> list[np.ndarray]:
+        """Simplify lines with the Douglas-Peucker algorithm.
+
+        :param lines: Vertex arrays of shape (n, 2).
+        :param tolerance: Maximum distance of removed vertices from the
+            simplified line.
+
+        :returns: The simplified vertex arrays.
+        """
+        coordinates, offsets = pack_lines(lines)
+        with self._spawning() as stack:
+            shared_coordinates = stack.enter_context(
+                SharedArray.from_array(coordinates)
+            )
+            shared_offsets = stack.enter_context(SharedArray.from_array(offsets))
+            keep = stack.enter_context(
+                SharedArray((len(coordinates),), np.dtype(bool).str)
+            )
+            self._map_chunks(
+                simplify_task,
+                (shared_coordinates.info, shared_offsets.info, keep.info),
+                chunk_lines(offsets, self.max_workers * CHUNKS_PER_WORKER),
+                tolerance,
+            )
+            mask = keep.array.copy()  # type: ignore[union-attr]
+
+        line_ids = np.repeat(np.arange(len(lines)), np.diff(offsets))
+        kept_offsets = np.zeros_like(offsets)
+        kept_offsets[1:] = np.cumsum(np.bincount(line_ids[mask], minlength=len(lines)))
+        return unpack_lines(coordinates[mask], kept_offsets)
+
+    def aggregate(
+        self,
+        lines: Sequence[np.ndarray],
+        travel_times: Sequence[float] | None = None,
+        tolerance: float = DEFAULT_TOLERANCE,
+    ) -> FlowNetwork:
+        """Aggregate route lines into a flow network.
+
+        The segments are keyed in chunks of lines and then counted in buckets
+        by key hash, both in the worker processes. See
+        ``kernels.aggregate_segments`` for the details of the aggregation.
+        """
+        if travel_times is None:
+            travel_times = [0.0] * len(lines)
+        totals = np.asarray(
+            [time for line, time in zip(lines, travel_times) if len(line) > 1],
+            dtype=np.float64,
+        )
+        lines = [line for line in lines if len(line) > 1]
+        coordinates, offsets = pack_lines(lines)
+        segment_count = int(offsets[-1]) - len(lines)
+
+        with self._spawning() as stack:
+            inputs = [
+                stack.enter_context(SharedArray.from_array(array))
+                for array in (coordinates, offsets, totals)
+            ]
+            outputs = [
+                stack.enter_context(SharedArray(shape, np.dtype(dtype).str))
+                for shape, dtype in (
+                    ((segment_count, 4), np.int64),
+                    ((segment_count,), np.float64),
+                    ((segment_count,), np.uint64),
+                    ((segment_count,), bool),
+                )
+            ]
+            self._map_chunks(
+                segment_task,
+                [shared.info for shared in (*inputs, *outputs)],
+                chunk_lines(offsets, self.max_workers * CHUNKS_PER_WORKER),
+                tolerance,
+            )
+
+            count_futures = [
+                self._executor.submit(
+                    run_attached,
+                    count_task,
+                    [shared.info for shared in outputs],
+                    bucket,
+                    self.max_workers,
+                )
+                for bucket in range(self.max_workers)
+            ]
+            buckets = [
+                [take_shared(info) for info in future.result()]
+                for future in count_futures
+            ]
+
+        keys, counts, times, first = (
+            np.concatenate(arrays) for arrays in zip(*buckets)
+        )
+        return flow_network(keys, counts, times, first, tolerance)
+
+    def assemble_matrix(
+        self,
+        origins: np.ndarray,
+        destinations: np.ndarray,
+        values: np.ndarray,
+        shape: tuple[int, int],
+    ) -> np.ndarray:
+        """Assemble a cost matrix from origin-destination results.
+
+        :param origins: Origin index of every result.
+        :param destinations: Destination index of every result.
+        :param values: Cost of every result.
+        :param shape: Shape of the matrix. Cells without results are NaN.
+
+        :returns: The cost matrix.
+        """
+        arrays = (
+            np.asarray(origins, dtype=np.int64),
+            np.asarray(destinations, dtype=np.int64),
+            np.asarray(values, dtype=np.float64),
+        )
+        with self._spawning() as stack:
+            inputs = [
+                stack.enter_context(SharedArray.from_array(array)) for array in arrays
+            ]
+            matrix = stack.enter_context(SharedArray(shape, np.dtype(np.float64).str))
+            matrix.array[...] = np.nan  # type: ignore[index]
+
+            chunk_count = self.max_workers * CHUNKS_PER_WORKER
+            bounds = np.unique(
+                np.linspace(0, len(arrays[2]), chunk_count + 1).astype(int)
+            )
+            self._map_chunks(
+                matrix_task,
+                [*(shared.info for shared in inputs), matrix.info],
+                [
+                    (int(first), int(last))
+                    for first, last in zip(bounds[:-1], bounds[1:])
+                ],
+            )
+            return matrix.array.copy()  # type: ignore[union-attr]
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -7,3 +7,18 @@ fixtures:
 * qgis_iface returns mocked QgsInterface
 * new_project makes sure that all the map layers and configurations are removed. This should be used with tests that add stuff to QgsProject.
 """
+
+import sys
+
+import pytest
+
+from cgiqgispluginsandboxday import session
+
+
+@pytest.fixture
+def clean_session(monkeypatch, tmp_path):
+    """Isolate the session state and its snapshot from the user's QGIS profile."""
+    monkeypatch.delitem(sys.modules, session.SESSION_MODULE_NAME, raising=False)
+    monkeypatch.setattr(
+        session, "snapshot_path", lambda: tmp_path / session.SNAPSHOT_FILE_NAME
+    )
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from cgiqgispluginsandboxday.cache import ResultCache
+from cgiqgispluginsandboxday.estimator import (
+    RouteSample,
+    TravelCostEstimator,
+    cache_route_result,
+    cached_samples,
+    fit_with_holdout,
+)
+
+
+def _samples(count: int, speed: float, detour: float, offset: float = 0.0):
+    rng = np.random.default_rng(1)
+    samples = []
+    for _ in range(count):
+        start = rng.uniform(0, 40000, 2) + offset
+        end = start + rng.uniform(-20000, 20000, 2)
+        distance = float(np.hypot(*(end - start)))
+        samples.append(
+            RouteSample(
+                start=(float(start[0]), float(start[1])),
+                end=(float(end[0]), float(end[1])),
+                travel_time=distance * detour / speed,
+                length=distance * detour,
+            )
+        )
+    return samples
+
+
+def test_estimator_learns_regional_models():
+    samples = _samples(50, speed=20.0, detour=1.3) + _samples(
+        50, speed=10.0, detour=1.6, offset=100000.0
+    )
+
+    estimator = TravelCostEstimator(min_region_samples=10).fit(samples)
+    error = estimator.evaluate(samples)
+
+    assert error.sample_count == len(samples)
+    assert error.time_mape < 0.05
+    assert error.length_mape < 0.05
+
+
+def test_rank_returns_best_candidates_first():
+    estimator = TravelCostEstimator().fit(_samples(100, speed=20.0, detour=1.3))
+    candidates = np.array([[30000.0, 0.0], [1000.0, 0.0], [5000.0, 0.0], [500.0, 0.0]])
+
+    ranked = estimator.rank((0.0, 0.0), candidates, k=3)
+
+    np.testing.assert_array_equal(ranked, [3, 1, 2])
+
+
+def test_fit_with_holdout_reports_error_on_cached_results():
+    cache = ResultCache()
+    for sample in _samples(40, speed=20.0, detour=1.3):
+        cache_route_result(sample, cache=cache)
+
+    estimator, error = fit_with_holdout(cached_samples(cache), holdout_fraction=0.25)
+
+    assert estimator.is_fitted
+    assert error.sample_count == 10
+    assert error.time_mape < 0.05
+
+
+def test_predict_requires_fitting():
+    with pytest.raises(RuntimeError):
+        TravelCostEstimator().predict(np.zeros((1, 2)), np.ones((1, 2)))
+
+
+def test_evaluate_without_positive_targets(recwarn):
+    estimator = TravelCostEstimator().fit(_samples(20, speed=20.0, detour=1.3))
+
+    error = estimator.evaluate([RouteSample((0.0, 0.0), (0.0, 0.0), 0.0, 0.0)])
+
+    assert np.isnan(error.time_mape)
+    assert np.isnan(error.length_mape)
+    assert not recwarn.list
@@ -0,0 +1,52 @@
+import pytest
+from qgis.core import QgsFeature, QgsGeometry, QgsVectorLayer
+from qgis.PyQt.QtCore import QUrlQuery
+
+from cgiqgispluginsandboxday.cache import GEOCODE_CACHE, get_cache
+from cgiqgispluginsandboxday.geocoding import (
+    feature_point,
+    geocoding_transform,
+    reverse_geocode,
+    reverse_geocode_feature,
+    reverse_geocode_key,
+    reverse_geocode_request,
+)
+
+
+def test_reverse_geocode_request_parameters(monkeypatch):
+    monkeypatch.setenv("NAVICI_API_KEY", "1234")
+
+    url = reverse_geocode_request(382673.2, 6677288.4).url()
+    query = QUrlQuery(url.query())
+
+    assert url.path() == "/geocoding/reverse"
+    assert query.queryItemValue("x") == "382673.2"
+    assert query.queryItemValue("y") == "6677288.4"
+    assert query.queryItemValue("from") == "EPSG:3067"
+    assert query.queryItemValue("apikey") == "1234"
+
+
+@pytest.mark.usefixtures("clean_session")
+def test_reverse_geocode_returns_cached_result():
+    result = {"features": [{"properties": {"label": "Karvaamokuja 2"}}]}
+    get_cache(GEOCODE_CACHE).put(reverse_geocode_key(382673.22, 6677288.38), result)
+
+    assert reverse_geocode(382673.24, 6677288.41) == result
+
+
+@pytest.mark.usefixtures("clean_session")
+def test_reverse_geocode_feature_uses_prefetched_point():
+    layer = QgsVectorLayer("Polygon?crs=EPSG:3067", "buildings", "memory")
+    feature = QgsFeature()
+    feature.setGeometry(
+        QgsGeometry.fromWkt(
+            "Polygon ((382670 6677280, 382680 6677280, 382680 6677295, "
+            "382670 6677295, 382670 6677280))"
+        )
+    )
+    # The point the prefetcher queues for the feature
+    point = feature_point(feature, geocoding_transform(layer))
+    result = {"features": [{"properties": {"label": "Karvaamokuja 2"}}]}
+    get_cache(GEOCODE_CACHE).put(reverse_geocode_key(point.x(), point.y()), result)
+
+    assert reverse_geocode_feature(layer, feature) == result
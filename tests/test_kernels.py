@@ -0,0 +1,74 @@
+import numpy as np
+
+from cgiqgispluginsandboxday.kernels import (
+    aggregate_segments,
+    count_keys,
+    flow_network,
+    route_segments,
+)
+
+
+def test_aggregate_segments_merges_both_directions():
+    routes = [
+        np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 10.0]]),
+        np.array([[10.0, 10.0], [10.0, 0.0], [0.0, 0.0]]),
+        np.array([[0.2, 0.1], [10.0, 0.0]]),
+    ]
+
+    network = aggregate_segments(*route_segments(routes, [20.0, 40.0, 5.0]))
+
+    assert len(network) == 2
+    np.testing.assert_array_equal(network.start, [[0.0, 0.0], [10.0, 0.0]])
+    np.testing.assert_array_equal(network.end, [[10.0, 0.0], [10.0, 10.0]])
+    np.testing.assert_array_equal(network.count, [3, 2])
+    np.testing.assert_allclose(network.travel_time, [35.0, 30.0])
+
+
+def test_aggregate_segments_drops_collapsed_segments():
+    routes = [np.array([[0.0, 0.0], [0.1, 0.1], [5.0, 0.0]])]
+
+    network = aggregate_segments(*route_segments(routes), tolerance=1.0)
+
+    assert len(network) == 1
+    np.testing.assert_array_equal(network.count, [1])
+
+
+def test_aggregate_segments_without_routes():
+    network = aggregate_segments(*route_segments([]))
+
+    assert len(network) == 0
+
+
+def test_aggregate_segments_keeps_time_of_collapsed_segments():
+    routes = [np.array([[0.0, 0.0], [5.0, 0.0], [5.1, 0.1], [10.0, 0.0]])]
+
+    network = aggregate_segments(*route_segments(routes, [30.0]))
+
+    assert len(network) == 2
+    np.testing.assert_allclose(network.travel_time.sum(), 30.0)
+
+
+def test_collapsed_segment_time_stays_on_its_route():
+    routes = [
+        np.array([[0.0, 10.0], [0.0, 0.0]]),
+        np.array([[0.1, 0.1], [0.2, 0.0], [10.0, 0.0]]),
+    ]
+
+    network = aggregate_segments(*route_segments(routes, [0.0, 100.0]))
+
+    np.testing.assert_array_equal(network.start, [[0.0, 0.0], [0.0, 0.0]])
+    np.testing.assert_array_equal(network.end, [[0.0, 10.0], [10.0, 0.0]])
+    np.testing.assert_allclose(network.travel_time, [0.0, 100.0])
+
+
+def test_count_keys_handles_hash_collisions():
+    keys = np.array([[0, 0, 1, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+
+    unique_keys, counts, times, first = count_keys(
+        keys, np.array([1.0, 2.0, 3.0]), np.zeros(3, dtype=np.uint64)
+    )
+
+    network = flow_network(unique_keys, counts, times, first)
+    np.testing.assert_array_equal(network.end, [[1.0, 0.0], [0.0, 1.0]])
+    np.testing.assert_array_equal(network.count, [2, 1])
+    np.testing.assert_allclose(network.travel_time, [4.0, 2.0])
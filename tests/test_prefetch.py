@@ -0,0 +1,74 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from qgis.core import QgsSettings
+
+from cgiqgispluginsandboxday.prefetch import (
+    BUDGET_SETTING,
+    BUDGET_WINDOW_S,
+    ReverseGeocodePrefetcher,
+)
+
+
+@pytest.fixture
+def prefetcher(qgis_canvas):
+    prefetcher = ReverseGeocodePrefetcher(qgis_canvas)
+    yield prefetcher
+    prefetcher.cancel()
+
+
+def test_budget_wait_drops_requests_outside_window(prefetcher):
+    prefetcher.requests_per_minute = 2
+    now = time.monotonic()
+    prefetcher._sent_times.extend([now - BUDGET_WINDOW_S - 1, now - 10, now])
+
+    wait = prefetcher._budget_wait()
+
+    assert len(prefetcher._sent_times) == 2
+    assert BUDGET_WINDOW_S - 11 < wait <= BUDGET_WINDOW_S - 10
+
+
+def test_budget_wait_is_zero_under_budget(prefetcher):
+    prefetcher.requests_per_minute = 2
+    prefetcher._sent_times.append(time.monotonic())
+
+    assert prefetcher._budget_wait() == 0.0
+
+
+def test_zero_budget_setting_allows_one_request_per_minute(qgis_canvas):
+    settings = QgsSettings()
+    settings.setValue(BUDGET_SETTING, 0)
+    try:
+        prefetcher = ReverseGeocodePrefetcher(qgis_canvas)
+    finally:
+        settings.remove(BUDGET_SETTING)
+
+    assert prefetcher.requests_per_minute == 1
+    assert prefetcher._budget_wait() == 0.0
+
+
+def test_yield_requeues_running_lookup(prefetcher):
+    reply = MagicMock()
+    prefetcher._queue.append((3.0, 4.0))
+    prefetcher._reply = reply
+    prefetcher._reply_point = (1.0, 2.0)
+
+    prefetcher._yield()
+
+    reply.abort.assert_called_once()
+    assert prefetcher._reply is None
+    assert list(prefetcher._queue) == [(1.0, 2.0), (3.0, 4.0)]
+
+
+def test_cancel_clears_queue_and_aborts_lookup(prefetcher):
+    reply = MagicMock()
+    prefetcher._queue.extend([(1.0, 2.0), (3.0, 4.0)])
+    prefetcher._reply = reply
+    prefetcher._reply_point = (5.0, 6.0)
+
+    prefetcher.cancel()
+
+    reply.abort.assert_called_once()
+    assert not prefetcher._queue
+    assert prefetcher._reply is None
@@ -0,0 +1,51 @@
+from qgis.core import QgsGeometry, QgsPointXY, QgsProject
+
+from cgiqgispluginsandboxday.rendering import (
+    STATUS_DONE,
+    STATUS_PENDING,
+    ProgressiveRouteLayer,
+)
+
+
+def test_placeholders_are_replaced_with_results():
+    routes = ProgressiveRouteLayer("EPSG:3067")
+    routes.add_placeholder("a", QgsPointXY(0, 0), QgsPointXY(10, 0))
+    routes.add_placeholder("b", QgsPointXY(0, 0), QgsPointXY(0, 10))
+    routes.flush()
+
+    assert routes.layer.featureCount() == 2
+    assert {feature["status"] for feature in routes.layer.getFeatures()} == {
+        STATUS_PENDING
+    }
+
+    geometry = QgsGeometry.fromWkt("LineString (0 0, 5 5, 10 0)")
+    routes.set_result("a", geometry, travel_time=60.0, length=14.1)
+    routes.flush()
+
+    features = {feature["route_id"]: feature for feature in routes.layer.getFeatures()}
+    assert features["a"]["status"] == STATUS_DONE
+    assert features["a"]["travel_time"] == 60.0
+    assert features["a"].geometry().equals(geometry)
+    assert features["b"]["status"] == STATUS_PENDING
+
+
+def test_result_before_flush_replaces_placeholder():
+    routes = ProgressiveRouteLayer("EPSG:3067")
+    routes.add_placeholder("a", QgsPointXY(0, 0), QgsPointXY(10, 0))
+    routes.set_result("a", QgsGeometry.fromWkt("LineString (0 0, 5 5, 10 0)"))
+    routes.flush()
+
+    assert routes.layer.featureCount() == 1
+    assert next(routes.layer.getFeatures())["status"] == STATUS_DONE
+
+
+def test_results_after_layer_removal_are_ignored(qgis_new_project):
+    routes = ProgressiveRouteLayer("EPSG:3067")
+    QgsProject.instance().addMapLayer(routes.layer)
+    routes.add_placeholder("a", QgsPointXY(0, 0), QgsPointXY(10, 0))
+
+    QgsProject.instance().removeMapLayer(routes.layer.id())
+    routes.set_result("a", QgsGeometry.fromWkt("LineString (0 0, 5 5, 10 0)"))
+    routes.flush()
+
+    assert not routes._pending_features
@@ -0,0 +1,80 @@
+import importlib
+import sys
+from collections import OrderedDict
+from unittest.mock import MagicMock
+
+import pytest
+
+from cgiqgispluginsandboxday import cache, estimator, session
+
+pytestmark = pytest.mark.usefixtures("clean_session")
+
+
+def test_state_survives_module_reload():
+    values = session.get_state("values", list)
+    values.append(1)
+
+    reloaded = importlib.reload(session)
+
+    assert reloaded.get_state("values", list) == [1]
+
+
+def test_persistent_state_is_restored_from_snapshot():
+    session.get_state("values", dict, persistent=True)["a"] = 1
+    session.get_state("pool", dict)["connection"] = object()
+    session.save_snapshot()
+
+    # Simulate a QGIS restart
+    del sys.modules[session.SESSION_MODULE_NAME]
+
+    assert session.get_state("values", dict, persistent=True) == {"a": 1}
+    assert session.get_state("pool", dict) == {}
+
+
+def test_clear_session_removes_snapshot():
+    session.get_state("values", dict, persistent=True)["a"] = 1
+    session.save_snapshot()
+
+    session.clear_session()
+
+    assert not session.snapshot_path().exists()
+    assert session.get_state("values", dict, persistent=True) == {}
+
+
+def test_caches_are_saved_after_plugin_reload():
+    sample = estimator.RouteSample((0.0, 0.0), (1000.0, 0.0), 60.0, 1200.0)
+    estimator.cache_route_result(sample)
+
+    # Simulate Plugin Reloader replacing the plugin classes
+    reloaded_cache = importlib.reload(cache)
+    reloaded_estimator = importlib.reload(estimator)
+    assert reloaded_estimator.cached_samples() == [
+        reloaded_estimator.RouteSample(*sample.__dict__.values())
+    ]
+    session.save_snapshot()
+
+    # Simulate a QGIS restart
+    del sys.modules[session.SESSION_MODULE_NAME]
+
+    route_cache = reloaded_cache.get_cache(reloaded_cache.ROUTE_CACHE)
+    assert isinstance(route_cache.entries, OrderedDict)
+    assert len(reloaded_estimator.cached_samples()) == 1
+
+
+def test_exit_hook_saves_with_reloaded_module(monkeypatch):
+    application = MagicMock()
+    monkeypatch.setattr(
+        session.QgsApplication, "instance", MagicMock(return_value=application)
+    )
+    session.install_exit_hook()
+
+    # Simulate Plugin Reloader replacing the session module
+    reloaded = importlib.reload(session)
+    save_snapshot = MagicMock()
+    monkeypatch.setattr(reloaded, "save_snapshot", save_snapshot)
+    reloaded.install_exit_hook()
+
+    application.aboutToQuit.connect.assert_called_once()
+    exit_hook = application.aboutToQuit.connect.call_args.args[0]
+    exit_hook()
+    save_snapshot.assert_called_once()
@@ -0,0 +1,138 @@
+import json
+from contextlib import ExitStack
+
+import numpy as np
+import pytest
+
+from cgiqgispluginsandboxday.kernels import (
+    SharedArray,
+    aggregate_segments,
+    count_task,
+    douglas_peucker,
+    flow_network,
+    pack_lines,
+    route_segments,
+    run_attached,
+    segment_task,
+    take_shared,
+    unpack_lines,
+)
+from cgiqgispluginsandboxday.workers import RoutePostProcessor
+
+
+@pytest.fixture(scope="module")
+def post_processor():
+    post_processor = RoutePostProcessor(max_workers=1)
+    yield post_processor
+    post_processor.shutdown()
+
+
+def test_pack_and_unpack_lines():
+    lines = [
+        np.array([[0.0, 0.0], [1.0, 1.0]]),
+        np.array([[2.0, 2.0], [3.0, 3.0], [4.0, 4.0]]),
+    ]
+
+    coordinates, offsets = pack_lines(lines)
+
+    np.testing.assert_array_equal(offsets, [0, 2, 5])
+    for unpacked, line in zip(unpack_lines(coordinates, offsets), lines):
+        np.testing.assert_array_equal(unpacked, line)
+
+
+def test_douglas_peucker_keeps_corners():
+    points = np.array([[0.0, 0.0], [1.0, 0.1], [2.0, 0.0], [2.0, 2.0]])
+
+    keep = douglas_peucker(points, tolerance=0.5)
+
+    np.testing.assert_array_equal(keep, [True, False, True, True])
+
+
+def test_segment_and_count_tasks_match_flow_aggregation():
+    lines = [
+        np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 10.0]]),
+        np.array([[10.0, 10.0], [10.0, 0.0], [10.1, 0.1]]),
+    ]
+    coordinates, offsets = pack_lines(lines)
+
+    with ExitStack() as stack:
+        inputs = [
+            stack.enter_context(SharedArray.from_array(array))
+            for array in (coordinates, offsets, np.array([20.0, 10.0]))
+        ]
+        outputs = [
+            stack.enter_context(SharedArray(shape, np.dtype(dtype).str))
+            for shape, dtype in (
+                ((4, 4), np.int64),
+                ((4,), np.float64),
+                ((4,), np.uint64),
+                ((4,), bool),
+            )
+        ]
+        infos = [shared.info for shared in (*inputs, *outputs)]
+        run_attached(segment_task, infos, 0, 1, 1.0)
+        run_attached(segment_task, infos, 1, 2, 1.0)
+        buckets = [
+            [
+                take_shared(info)
+                for info in run_attached(
+                    count_task, [shared.info for shared in outputs], bucket, 2
+                )
+            ]
+            for bucket in range(2)
+        ]
+
+    network = flow_network(*(np.concatenate(arrays) for arrays in zip(*buckets)))
+    expected = aggregate_segments(*route_segments(lines, [20.0, 10.0]))
+    np.testing.assert_array_equal(network.start, expected.start)
+    np.testing.assert_array_equal(network.end, expected.end)
+    np.testing.assert_array_equal(network.count, expected.count)
+    np.testing.assert_allclose(network.travel_time, expected.travel_time)
+
+
+def test_aggregate_in_worker_process_matches_in_process(post_processor):
+    rng = np.random.default_rng(0)
+    lines = [rng.integers(0, 20, size=(5, 2)).astype(float) for _ in range(50)]
+    travel_times = rng.uniform(10, 100, size=50).tolist()
+
+    network = post_processor.aggregate(lines, travel_times)
+
+    expected = aggregate_segments(*route_segments(lines, travel_times))
+    np.testing.assert_array_equal(network.start, expected.start)
+    np.testing.assert_array_equal(network.end, expected.end)
+    np.testing.assert_array_equal(network.count, expected.count)
+    np.testing.assert_allclose(network.travel_time, expected.travel_time)
+
+
+def test_simplify_in_worker_process_matches_in_process(post_processor):
+    lines = [
+        np.array([[0.0, 0.0], [1.0, 0.1], [2.0, 0.0], [2.0, 2.0]]),
+        np.array([[0.0, 0.0], [5.0, 0.0]]),
+    ]
+
+    simplified = post_processor.simplify(lines, tolerance=0.5)
+
+    for result, line in zip(simplified, lines):
+        np.testing.assert_array_equal(result, line[douglas_peucker(line, 0.5)])
+
+
+def test_decode_in_worker_process(post_processor):
+    geometries = [
+        {"type": "LineString", "coordinates": [[0.0, 0.0], [1.0, 1.0]]},
+        {"type": "LineString", "coordinates": []},
+        {
+            "type": "MultiLineString",
+            "coordinates": [
+                [[2.0, 2.0], [3.0, 3.0]],
+                [[4.0, 4.0, 1.0], [5.0, 5.0, 1.0]],
+            ],
+        },
+    ]
+
+    decoded = post_processor.decode([json.dumps(geometry) for geometry in geometries])
+
+    assert [len(parts) for parts in decoded] == [1, 1, 2]
+    np.testing.assert_array_equal(decoded[0][0], [[0.0, 0.0], [1.0, 1.0]])
+    assert decoded[1][0].shape == (0, 2)
+    np.testing.assert_array_equal(decoded[2][0], [[2.0, 2.0], [3.0, 3.0]])
+    np.testing.assert_array_equal(decoded[2][1], [[4.0, 4.0], [5.0, 5.0]])